@@ -1,5 +1,9 @@
 import os
 import argparse
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
 import pandas as pd
 
@@ -13,79 +17,184 @@ except Exception as e:
 
 HERE = os.path.dirname(os.path.abspath(__file__))
 DEFAULT_H1 = os.path.normpath(os.path.join(HERE, "..", "LocalModels", "Hospital1", "hospital1_weights.csv"))
-DEFAULT_H2 = os.path.normpath(os.path.join(HERE, "..", "LocalModels", "Hospital2", "hospital2_weights.csv"))
+DEFAULT_H2 = os.path.normpath(os.path.join(HERE, "..", "LocalModels", "Hospital2", "Hospital2weights.parquet"))
 
 KEY_DIR    = os.path.join(HERE, "keys")
+PARAMS_JSON = os.path.join(KEY_DIR, "ckks_params.json")
 CT_DIR     = os.path.join(HERE, "ciphertexts")
 GLOBAL_DIR = os.path.join(HERE, "global")
+FEATURES_JSON = os.path.join(GLOBAL_DIR, "features.json")
 
-def _find_coef_column(df: pd.DataFrame) -> str:
+MIN_POLY_DEGREE = 2**13
+
+def _find_coef_column(columns) -> str:
     for cand in ("Coefficient", "coefficient", "coef", "Coef"):
-        if cand in df.columns:
+        if cand in columns:
             return cand
-    raise ValueError(f"Coefficient column not found. Available columns: {list(df.columns)}")
+    raise ValueError(f"Coefficient column not found. Available columns: {list(columns)}")
+
+def _read_weights_table(path: str) -> tuple:
+    """
+    Read a weights table and return (coefficients as float64, feature names or None).
+    Parquet files keep their typed columns. CSVs skip pandas: csv.reader parses the header to
+    pick the column indices, then one quote-aware np.loadtxt pass reads only those columns
+    (empty coefficient cells become NaN, as pd.read_csv would give).
+    """
+    if path.lower().endswith(".parquet"):
+        df = pd.read_parquet(path)
+        names = df["Feature"].to_numpy().astype(str) if "Feature" in df.columns else None
+        return df[_find_coef_column(df.columns)].to_numpy(dtype=np.float64), names
+
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        header = [c.strip() for c in next(csv.reader(f), [])]
+    coef_idx = header.index(_find_coef_column(header))
+    has_feature = "Feature" in header
+    usecols = (header.index("Feature"), coef_idx) if has_feature else (coef_idx,)
+    rows = np.loadtxt(path, delimiter=",", quotechar='"', skiprows=1, usecols=usecols,
+                      dtype=str, comments=None, ndmin=2, encoding="utf-8-sig")
+    raw = np.char.strip(rows[:, -1])
+    coefs = np.where(raw == "", "nan", raw).astype(np.float64)
+    return coefs, (rows[:, 0] if has_feature else None)
+
+@lru_cache(maxsize=None)
+def _load_weights_cached(csv_path: str) -> tuple:
+    """
+    Parse a weights file (CSV or Parquet) once into (vec, features) and memoize it per path.
+    vec is [coef_0, ..., coef_(n-1), intercept]; features lists the matching names plus 'Intercept'.
+    """
+    vec, names = _read_weights_table(csv_path)
+    last = len(vec) - 1
+
+    if names is not None:
+        hits = np.flatnonzero(np.char.lower(names) == "intercept")
+        pos = int(hits[0]) if hits.size else last
+        if pos != last:
+            order = np.r_[np.arange(pos), np.arange(pos + 1, len(vec)), pos]
+            vec, names = vec[order], names[order]
+        features = names[:-1].tolist()
+    else:
+        features = [f"f{i}" for i in range(last)]
+
+    return vec, features + ["Intercept"]
 
 def weights_csv_to_vector(csv_path: str) -> np.ndarray:
     """
     Build vector [coef_0, ..., coef_(n-1), intercept] from a weights CSV.
     Accepts either an explicit 'Intercept' row in 'Feature', or treats last row as intercept.
     """
-    df = pd.read_csv(csv_path)
-    coef_col = _find_coef_column(df)
-
-    if "Feature" in df.columns:
-        mask_int = df["Feature"].astype(str).str.lower().eq("intercept")
-        if mask_int.any():
-            intercept = float(df.loc[mask_int, coef_col].values[0])
-            coefs = df.loc[~mask_int, coef_col].astype(float).values
-        else:
-            intercept = float(df[coef_col].values[-1])
-            coefs = df[coef_col].values[:-1].astype(float)
-    else:
-        intercept = float(df[coef_col].values[-1])
-        coefs = df[coef_col].values[:-1].astype(float)
-
-    vec = np.concatenate([coefs, [intercept]]).astype(float)
-    return vec
+    vec, _ = _load_weights_cached(csv_path)
+    return vec.copy()
 
 def weights_csv_feature_names(csv_path: str) -> list:
     """
     Return feature names in the same order as coefficients in weights_csv_to_vector (excluding intercept).
     If no 'Feature' column, synthesize names like f0,f1,... and 'Intercept'.
     """
-    df = pd.read_csv(csv_path)
-    coef_col = _find_coef_column(df)
+    _, features = _load_weights_cached(csv_path)
+    return list(features)
 
-    if "Feature" in df.columns:
-        mask_int = df["Feature"].astype(str).str.lower().eq("intercept")
-        if mask_int.any():
-            features = df.loc[~mask_int, "Feature"].astype(str).tolist()
-        else:
-            features = df["Feature"].astype(str).tolist()[:-1]
-    else:
-        n = len(df[coef_col].values) - 1
-        features = [f"f{i}" for i in range(n)]
+def save_feature_names(features: list) -> str:
+    """
+    Write the canonical feature order to FEATURES_JSON so decryption needs no hospital weights file.
+    """
+    with open(FEATURES_JSON, "w") as f:
+        json.dump(list(features), f)
+    return FEATURES_JSON
 
-    return features + ["Intercept"]
+def load_feature_names() -> list:
+    with open(FEATURES_JSON) as f:
+        return json.load(f)
 
 def ensure_dirs():
     os.makedirs(KEY_DIR, exist_ok=True)
     os.makedirs(CT_DIR, exist_ok=True)
     os.makedirs(GLOBAL_DIR, exist_ok=True)
 
-def keygen_if_missing(poly_degree=2**15, scale_bits=40, sec_bits=128) -> Pyfhel:
+def save_ctxt(ctxt: PyCtxt, path: str, compress: bool = False) -> str:
+    """
+    Write a ciphertext as raw bytes. Uncompressed by default: zstd dominates serialization
+    cost for CKKS ciphertexts, so intermediate files under CT_DIR skip it and only the final
+    global ciphertext handed to external consumers is compressed.
+    """
+    with open(path, "wb") as f:
+        f.write(ctxt.to_bytes(compr_mode="zstd" if compress else "none"))
+    return path
+
+def load_ctxt(HE: Pyfhel, path: str) -> PyCtxt:
+    """
+    Read a ciphertext written by save_ctxt (compression is detected from the SEAL header).
+    PyCtxt.from_bytes only accepts `bytes`, so one in-memory copy of the file is unavoidable;
+    a single f.read() is that copy, and it is released as soon as SEAL has parsed it.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    ctxt = PyCtxt(pyfhel=HE)
+    ctxt.from_bytes(data, scheme="CKKS")
+    return ctxt
+
+def _as_ctxt(HE: Pyfhel, ct) -> PyCtxt:
+    """
+    Return ct unchanged if it is already a PyCtxt, otherwise load it from the given path.
+    """
+    if isinstance(ct, PyCtxt):
+        return ct
+    return load_ctxt(HE, ct)
+
+def _next_pow2(x: int) -> int:
+    return 1 << max(0, x - 1).bit_length()
+
+def ckks_poly_degree(max_len: int) -> int:
+    """
+    Smallest power-of-two ring degree N whose N/2 slots hold max_len values, never below
+    MIN_POLY_DEGREE (the smallest N that still gives 128-bit security at scale 2**40).
+    NTT cost grows as N log N, so tiny weight vectors should not pay for N=2**15.
+    """
+    return max(MIN_POLY_DEGREE, _next_pow2(2 * max_len))
+
+def _key_paths(poly_degree: int) -> tuple[str, str, str, str]:
+    """
+    Context/public/secret/rotation key paths. N is part of the name so keys for another ring size are never reused.
+    """
+    return (
+        os.path.join(KEY_DIR, f"ckks_context_n{poly_degree}.bin"),
+        os.path.join(KEY_DIR, f"ckks_public_n{poly_degree}.key"),
+        os.path.join(KEY_DIR, f"ckks_secret_n{poly_degree}.key"),
+        os.path.join(KEY_DIR, f"ckks_rotate_n{poly_degree}.key"),
+    )
+
+def _record_poly_degree(poly_degree: int):
+    with open(PARAMS_JSON, "w") as f:
+        json.dump({"poly_degree": poly_degree}, f)
+
+def saved_poly_degree() -> int:
+    """
+    Ring degree N of the key set last created/loaded by keygen_if_missing (stored in PARAMS_JSON).
+    """
+    if not os.path.exists(PARAMS_JSON):
+        raise FileNotFoundError(f"No CKKS parameters recorded in {PARAMS_JSON}. Run keygen/encrypt first.")
+    with open(PARAMS_JSON) as f:
+        return int(json.load(f)["poly_degree"])
+
+def keygen_if_missing(poly_degree=MIN_POLY_DEGREE, scale_bits=40, sec_bits=128, rotate=False) -> Pyfhel:
     """
     Create or load CKKS context & keys. RNS optimization is used internally by Pyfhel for CKKS.
+    The chosen N is recorded in PARAMS_JSON so the server and decrypt side load the same key set.
+    rotate=True also provides rotation (Galois) keys for aggregate_packed. They are only made
+    on request, and for an existing key set they are derived from its secret key rather than
+    regenerating everything (which would orphan ciphertexts under the old keys).
     """
-    ctx_path = os.path.join(KEY_DIR, "ckks_context.bin")
-    pub_path = os.path.join(KEY_DIR, "ckks_public.key")
-    sec_path = os.path.join(KEY_DIR, "ckks_secret.key")
+    ctx_path, pub_path, sec_path, rot_path = _key_paths(poly_degree)
 
     HE = Pyfhel()
     if os.path.exists(ctx_path) and os.path.exists(pub_path) and os.path.exists(sec_path):
-        HE.contextLoad(ctx_path)
-        HE.restorepublicKey(pub_path)
-        HE.restoresecretKey(sec_path)
+        HE.load_context(ctx_path)
+        HE.load_public_key(pub_path)
+        HE.load_secret_key(sec_path)
+        if rotate and not os.path.exists(rot_path):
+            HE.rotateKeyGen()
+            HE.save_rotate_key(rot_path)
+            print(f"✅ Rotation keys generated in {KEY_DIR} (n={poly_degree})")
+        _record_poly_degree(poly_degree)
         return HE
 
     HE.contextGen(
@@ -95,117 +204,280 @@ def keygen_if_missing(poly_degree=2**15, scale_bits=40, sec_bits=128) -> Pyfhel:
         sec=sec_bits
     )
     HE.keyGen()
-    HE.contextSave(ctx_path)
-    HE.savepublicKey(pub_path)
-    HE.savesecretKey(sec_path)
-    print(f"✅ Keys generated in {KEY_DIR}")
+    HE.save_context(ctx_path)
+    HE.save_public_key(pub_path)
+    HE.save_secret_key(sec_path)
+    if rotate:
+        HE.rotateKeyGen()
+        HE.save_rotate_key(rot_path)
+    _record_poly_degree(poly_degree)
+    print(f"✅ Keys generated in {KEY_DIR} (n={poly_degree})")
     return HE
 
-def load_for_server() -> Pyfhel:
+def load_for_server(poly_degree=None, rotate=False) -> Pyfhel:
     """
     Load context + public key (no secret key). Use on aggregator/server side.
+    poly_degree defaults to saved_poly_degree().
+    rotate=True also loads the rotation (Galois) keys needed by aggregate_packed.
     """
+    ctx_path, pub_path, _, rot_path = _key_paths(poly_degree or saved_poly_degree())
     HE = Pyfhel()
-    HE.contextLoad(os.path.join(KEY_DIR, "ckks_context.bin"))
-    HE.restorepublicKey(os.path.join(KEY_DIR, "ckks_public.key"))
+    HE.load_context(ctx_path)
+    HE.load_public_key(pub_path)
+    if rotate:
+        HE.load_rotate_key(rot_path)
     return HE
 
-def load_for_decrypt() -> Pyfhel:
+def load_for_decrypt(poly_degree=None) -> Pyfhel:
     """
     Load context + public + secret key (client/hospital side).
+    poly_degree defaults to saved_poly_degree().
     """
+    ctx_path, pub_path, sec_path, _ = _key_paths(poly_degree or saved_poly_degree())
     HE = Pyfhel()
-    HE.contextLoad(os.path.join(KEY_DIR, "ckks_context.bin"))
-    HE.restorepublicKey(os.path.join(KEY_DIR, "ckks_public.key"))
-    HE.restoresecretKey(os.path.join(KEY_DIR, "ckks_secret.key"))
+    HE.load_context(ctx_path)
+    HE.load_public_key(pub_path)
+    HE.load_secret_key(sec_path)
     return HE
 
-def encrypt_weights_csv(weights_csv: str, out_name: str, verify: bool = False) -> str:
-    HE = keygen_if_missing()
+def report_encryption(HE: Pyfhel, weights_csv: str, out_path: str, verify: bool = False):
+    """
+    Print the encryption summary for one hospital and, with verify=True, decrypt the copy read
+    back from disk so the save_ctxt -> load_ctxt round-trip is exercised too.
+    """
     vec = weights_csv_to_vector(weights_csv)
+    print(f"🔐 Encrypted {os.path.basename(weights_csv)} → {out_path} (len={len(vec)})")
+    if not verify:
+        return
+    reloaded = load_ctxt(HE, out_path)
+    try:
+        dec = HE.decryptFrac(reloaded)
+        k = min(5, len(vec))
+        print("   Verify round-trip from disk (first few entries):")
+        for i in range(k):
+            print(f"     orig={vec[i]: .6f}   dec={dec[i]: .6f}")
+    except Exception as e:
+        print(f"   (Verification skipped: {e})")
+
+def encrypt_weights_csv(weights_csv: str, out_name: str, verify: bool = False, return_ctxt: bool = False,
+                        poly_degree: int = None, HE: Pyfhel = None, report: bool = True):
+    """
+    Encrypt a hospital's weights, zero-padded to all CKKS slots, into one ciphertext under CT_DIR.
+    Returns the path, or (path, ctxt) with return_ctxt=True; pass HE to share keys across threads.
+    """
+    vec = weights_csv_to_vector(weights_csv)
+    if HE is None:
+        HE = keygen_if_missing(poly_degree or ckks_poly_degree(len(vec)))
+    n_slots = HE.get_nSlots()
+    if len(vec) > n_slots:
+        raise ValueError(f"Weight vector ({len(vec)}) does not fit in {n_slots} CKKS slots.")
 
-    ptxt = HE.encodeVec(vec)      
-    ctxt = HE.encryptPtxt(ptxt)   
+    ptxt = HE.encodeFrac(np.pad(vec, (0, n_slots - len(vec))))
+    ctxt = HE.encryptPtxt(ptxt)
 
     out_path = os.path.join(CT_DIR, out_name)
-    ctxt.save(out_path)
-    print(f"🔐 Encrypted {os.path.basename(weights_csv)} → {out_path} (len={len(vec)})")
-
-    if verify:
-        try:
-            dec = HE.decryptFrac(ctxt)
-            k = min(5, len(vec))
-            print("   Verify (first few entries):")
-            for i in range(k):
-                print(f"     orig={vec[i]: .6f}   dec={dec[i]: .6f}")
-        except Exception as e:
-            print(f"   (Verification skipped: {e})")
+    # Fresh, but saved in full: Pyfhel has no seeded (c0 + PRNG seed) ciphertext serialization.
+    save_ctxt(ctxt, out_path)
+    if report:
+        report_encryption(HE, weights_csv, out_path, verify=verify)
 
+    if return_ctxt:
+        return out_path, ctxt
     return out_path
 
-def aggregate_ciphertexts(ct_paths, average=True) -> str:
-    HE = load_for_server()
-    agg = PyCtxt(pyfhel=HE, serialized=True, fileName=ct_paths[0])
-    for p in ct_paths[1:]:
-        c = PyCtxt(pyfhel=HE, serialized=True, fileName=p)
-        agg += c
+def scale_ciphertext(HE: Pyfhel, ctxt: PyCtxt, factor: float) -> PyCtxt:
+    """
+    Multiply every slot of ctxt by factor using one encoded plaintext and a plain multiply.
+    The rescale drops one level of the modulus chain, which is fine because no further
+    multiplications follow the averaging step.
+    """
+    factor_ptxt = HE.encodeFrac(np.full(HE.get_nSlots(), factor, dtype=np.float64))
+    ctxt = HE.multiply_plain(ctxt, factor_ptxt)
+    HE.rescale_to_next(ctxt)
+    return ctxt
+
+def pairwise_reduce(HE: Pyfhel, cts: list, max_workers: int = None) -> PyCtxt:
+    """
+    Sum ciphertexts as a tree: adjacent pairs are added level by level, giving log2(K)
+    dependency depth instead of a K-1 long chain. Every add writes a new ciphertext,
+    so the inputs are left untouched.
+    """
+    level = list(cts)
+    if len(level) <= 3:
+        # At most one pair per level: a thread pool would only add overhead.
+        while len(level) > 1:
+            level = [HE.add(level[0], level[1], in_new_ctxt=True)] + level[2:]
+        return level[0]
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(level) // 2)) as ex:
+        while len(level) > 1:
+            sums = list(ex.map(lambda a, b: HE.add(a, b, in_new_ctxt=True), level[0::2], level[1::2]))
+            if len(level) % 2:
+                sums.append(level[-1])
+            level = sums
+    return level[0]
+
+def aggregate_ciphertexts(ct_paths_or_objs, average=True, poly_degree=None):
+    """
+    Homomorphically sum (or average) ciphertexts given as file paths or PyCtxt objects.
+    Paths are deserialized; PyCtxt objects are used directly and are never mutated.
+    The result is always saved under GLOBAL_DIR. If every input was a path, the saved path is
+    returned (ready to send over the network); otherwise the PyCtxt itself is returned so a
+    local decrypt can skip another load.
+    """
+    HE = load_for_server(poly_degree)
+    inputs_are_serialized = not any(isinstance(ct, PyCtxt) for ct in ct_paths_or_objs)
+
+    cts = [_as_ctxt(HE, ct) for ct in ct_paths_or_objs]
+    agg = pairwise_reduce(HE, cts) if len(cts) > 1 else PyCtxt(copy_ctxt=cts[0])
     if average:
-        agg *= (1.0 / len(ct_paths))
+        agg = scale_ciphertext(HE, agg, 1.0 / len(ct_paths_or_objs))
     out_path = os.path.join(GLOBAL_DIR, "global_avg.ct" if average else "global_sum.ct")
-    agg.save(out_path)
+    save_ctxt(agg, out_path, compress=True)
     print(f"🧮 Saved homomorphic {'average' if average else 'sum'} → {out_path}")
+    return out_path if inputs_are_serialized else agg
+
+def encrypt_packed(weights_paths: list, out_name: str = "hospitals_packed.ct", return_ctxt: bool = False,
+                   poly_degree: int = None):
+    """
+    Encrypt K hospitals' weight vectors into ONE ciphertext: hospital k occupies slots
+    [k*L, (k+1)*L), and the window count is rounded up to a power of two with zero windows
+    so aggregate_packed can fold them with log2 rotations. One encrypt/save replaces K.
+    Only valid when a single trusted party holds every hospital's plaintext weights.
+    Returns the saved path, or (path, ctxt) with return_ctxt=True; L is the per-hospital vector length.
+    """
+    vecs = [weights_csv_to_vector(p) for p in weights_paths]
+    save_feature_names(weights_csv_feature_names(weights_paths[0]))
+    L = len(vecs[0])
+    if any(len(v) != L for v in vecs):
+        raise ValueError(f"Weight vector length mismatch: {[len(v) for v in vecs]}. Align features & intercept.")
+    packed_len = _next_pow2(len(vecs)) * L
+    HE = keygen_if_missing(poly_degree or ckks_poly_degree(packed_len), rotate=True)
+    n_slots = HE.get_nSlots()
+    if packed_len > n_slots:
+        raise ValueError(f"{len(vecs)} packed vectors of length {L} do not fit in {n_slots} CKKS slots.")
+
+    packed = np.zeros(n_slots, dtype=np.float64)
+    packed[:len(vecs) * L] = np.concatenate(vecs)
+    ctxt = HE.encryptPtxt(HE.encodeFrac(packed))
+
+    out_path = os.path.join(CT_DIR, out_name)
+    save_ctxt(ctxt, out_path)
+    print(f"🔐 Encrypted {len(vecs)} hospitals into one ciphertext → {out_path} (window={L})")
+    if return_ctxt:
+        return out_path, ctxt
     return out_path
 
-def decrypt_ciphertext_to_csv(ct_path: str, canonical_features: list) -> tuple[str, str]:
-    HE = load_for_decrypt()
-    ctxt = PyCtxt(pyfhel=HE, serialized=True, fileName=ct_path)
-    vec = HE.decryptFrac(ctxt)
+def aggregate_packed(ct, n_hospitals: int, window: int, average=True, poly_degree=None):
+    """
+    Sum the hospital windows of an encrypt_packed ciphertext into slots [0, window) with the
+    rotation-sum pattern: agg += rotate(agg, s) for s = L, 2L, ..., (P/2)L where P is the padded
+    window count. Slots past the last window are zero, so the cyclic rotation never wraps data
+    into window 0. Returns a path or PyCtxt following the same rule as aggregate_ciphertexts.
+    """
+    HE = load_for_server(poly_degree, rotate=True)
+    agg = PyCtxt(copy_ctxt=ct) if isinstance(ct, PyCtxt) else load_ctxt(HE, ct)
 
-    out_csv_idx = os.path.join(GLOBAL_DIR, "global_weights.csv")
-    pd.DataFrame({"Index": np.arange(len(vec)), "Value": vec}).to_csv(out_csv_idx, index=False)
+    step, span = window, _next_pow2(n_hospitals) * window
+    while step < span:
+        agg = HE.add(agg, HE.rotate(agg, step, in_new_ctxt=True))
+        step *= 2
+    if average:
+        agg = scale_ciphertext(HE, agg, 1.0 / n_hospitals)
+    out_path = os.path.join(GLOBAL_DIR, "global_avg.ct" if average else "global_sum.ct")
+    save_ctxt(agg, out_path, compress=True)
+    print(f"🧮 Saved packed homomorphic {'average' if average else 'sum'} → {out_path}")
+    return agg if isinstance(ct, PyCtxt) else out_path
 
-    if len(canonical_features) != len(vec):
+def decrypt_ciphertext_to_csv(ct_path, canonical_features: list = None, poly_degree=None,
+                              debug: bool = False) -> tuple:
+    """
+    Decrypt the global ciphertext and write global_weights_named.csv (Feature/Coefficient)
+    in a single csv.writer pass. The raw Index/Value dump is only written when debug=True.
+    canonical_features defaults to the FEATURES_JSON sidecar written at encrypt time.
+    Returns (index_csv_or_None, named_csv).
+    """
+    if canonical_features is None:
+        canonical_features = load_feature_names()
+    HE = load_for_decrypt(poly_degree)
+    ctxt = _as_ctxt(HE, ct_path)
+    vec = HE.decryptFrac(ctxt)
+    if len(canonical_features) > len(vec):
         raise ValueError(
             f"Length mismatch: features({len(canonical_features)}) vs values({len(vec)}). "
             "Ensure both hospitals used identical feature order + intercept."
         )
-    out_csv_named = os.path.join(GLOBAL_DIR, "global_weights_named.csv")
-    pd.DataFrame({"Feature": canonical_features, "Coefficient": vec}).to_csv(out_csv_named, index=False)
+    vec = np.asarray(vec)[:len(canonical_features)]
 
-    print(f"🔓 Decrypted {ct_path} →")
-    print(f"   - {out_csv_idx} (Index/Value)")
+    values = vec.tolist()
+    out_csv_named = os.path.join(GLOBAL_DIR, "global_weights_named.csv")
+    with open(out_csv_named, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("Feature", "Coefficient"))
+        writer.writerows(zip(canonical_features, values))
+
+    out_csv_idx = None
+    if debug:
+        out_csv_idx = os.path.join(GLOBAL_DIR, "global_weights.csv")
+        with open(out_csv_idx, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("Index", "Value"))
+            writer.writerows(enumerate(values))
+
+    print(f"🔓 Decrypted {ct_path if isinstance(ct_path, str) else 'in-memory ciphertext'} →")
+    if out_csv_idx:
+        print(f"   - {out_csv_idx} (Index/Value)")
     print(f"   - {out_csv_named} (Feature/Coefficient)")
     return out_csv_idx, out_csv_named
 
 def main():
     ensure_dirs()
     ap = argparse.ArgumentParser(description="CKKS-RNS Homomorphic Encryption for Federated LR Weights")
-    ap.add_argument("--h1", default=DEFAULT_H1, help="Hospital-1 weights CSV path")
-    ap.add_argument("--h2", default=DEFAULT_H2, help="Hospital-2 weights CSV path")
+    ap.add_argument("--h1", default=DEFAULT_H1, help="Hospital-1 weights CSV/Parquet path")
+    ap.add_argument("--h2", default=DEFAULT_H2, help="Hospital-2 weights CSV/Parquet path")
     ap.add_argument("--sum", dest="do_sum", action="store_true", help="Use sum (default is average)")
     ap.add_argument("--verify", action="store_true", help="Print small decrypt check after encrypt")
+    ap.add_argument("--debug", action="store_true", help="Also write the raw Index/Value global_weights.csv")
+    ap.add_argument("--packed", action="store_true",
+                    help="Pack all hospitals into one ciphertext and aggregate with rotations")
     args = ap.parse_args()
+    if args.packed and args.verify:
+        ap.error("--verify checks one hospital ciphertext per file and is not supported with --packed")
 
     if not os.path.exists(args.h1):
         raise FileNotFoundError(f"Hospital-1 weights not found: {args.h1}")
     if not os.path.exists(args.h2):
         raise FileNotFoundError(f"Hospital-2 weights not found: {args.h2}")
 
-    ct1 = encrypt_weights_csv(args.h1, "hospital1.ct", verify=args.verify)
-    ct2 = encrypt_weights_csv(args.h2, "hospital2.ct", verify=args.verify)
-
     len1 = len(weights_csv_to_vector(args.h1))
     len2 = len(weights_csv_to_vector(args.h2))
     if len1 != len2:
         raise ValueError(f"Weight vector length mismatch: H1={len1}, H2={len2}. Align features & intercept.")
 
-    global_ct = aggregate_ciphertexts([ct1, ct2], average=(not args.do_sum))
-
-    canonical_feats = weights_csv_feature_names(args.h1)
-    decrypt_ciphertext_to_csv(global_ct, canonical_feats)
+    hospitals = [args.h1, args.h2]
+    if args.packed:
+        n = ckks_poly_degree(_next_pow2(len(hospitals)) * len1)
+        _, packed_ct = encrypt_packed(hospitals, return_ctxt=True, poly_degree=n)
+        global_ct = aggregate_packed(packed_ct, len(hospitals), len1, average=(not args.do_sum), poly_degree=n)
+    else:
+        n = ckks_poly_degree(max(len1, len2))
+        save_feature_names(weights_csv_feature_names(args.h1))
+        HE = keygen_if_missing(n)  # once, in this thread, so worker threads never race on keygen
+        with ThreadPoolExecutor(max_workers=len(hospitals)) as ex:
+            futures = [
+                ex.submit(encrypt_weights_csv, path, f"hospital{i}.ct",
+                          return_ctxt=True, poly_degree=n, HE=HE, report=False)
+                for i, path in enumerate(hospitals, 1)
+            ]
+            results = [f.result() for f in futures]
+        for path, (ct_path, _) in zip(hospitals, results):
+            report_encryption(HE, path, ct_path, verify=args.verify)
+        cts = [ctxt for _, ctxt in results]
+        global_ct = aggregate_ciphertexts(cts, average=(not args.do_sum), poly_degree=n)
+
+    decrypt_ciphertext_to_csv(global_ct, poly_degree=n, debug=args.debug)
 
     print("\n✅ Done. Keys in 'keys/'. Ciphertexts in 'ciphertexts/'. Global outputs in 'global/'.")
-    print("   Keep 'ckks_secret.key' private. Share only context + public key + ciphertexts with server.")
+    print("   Keep 'ckks_secret_n*.key' private. Share only context + public key + ciphertexts with server.")
 
 if __name__ == "__main__":
     main()
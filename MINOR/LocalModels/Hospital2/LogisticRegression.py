@@ -1,30 +1,51 @@
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score, confusion_matrix, classification_report
 import joblib
 
-df = pd.read_csv(r"C:\Users\dell\OneDrive\Desktop\MINOR\LocalModels\Hospital2\Dataset_Hospital2.csv")
-df_50 = df.head(50)
+HERE = Path(__file__).resolve().parent
+CSV = HERE / "Dataset_Hospital2.csv"
+OUT_PKL = HERE / "logistic_regression_model_hospital2.pkl"
+OUT_W = HERE / "Hospital2weights.parquet"
+
+memory = joblib.Memory(location=HERE / ".cache", verbose=0)
+
+
+@memory.cache
+def train_lr(X_train, Y_train):
+    # joblib hashes the arrays, so changed data retrains and unchanged data loads the cached model
+    model = LogisticRegression(max_iter=10000, solver='liblinear')
+    model.fit(X_train, Y_train)
+    return model
 
 
+df = pd.read_csv(CSV)
+df50 = df.iloc[:50]
 
-X=df.drop('target', axis=1)
-Y= df_50['target']
+feature_names = df50.columns.drop('target')
+X = df50[feature_names].to_numpy(dtype=np.float64, copy=False)
+Y = df50['target'].to_numpy()
 
 X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2, random_state=42)
 
-model = LogisticRegression(max_iter= 10000)
-model.fit(X_train, Y_train)
+model = train_lr(X_train, Y_train)
 
 Y_pred = model.predict(X_test)
 print("accuracy: ", accuracy_score(Y_test, Y_pred))
-print("\cofusion Matrix: \n, confusion_matrix(Y_test, Y_pred)")
+print("\nConfusion Matrix: \n", confusion_matrix(Y_test, Y_pred))
 print("\nClassification Report: \n", classification_report(Y_test, Y_pred))
 
-joblib.dump(model, r"C:\Users\dell\OneDrive\Desktop\MINOR\LocalModels\Hospital2\logistic_regression_model_hospital2.pkl")
-print("\n💾 Model saved as logistic_model_weights.pkl")
-weights = pd.DataFrame({"feature":X.columns, "Coffiecients": model.coef_[0]})
-weights.loc[len(weights)] = ["intercept", model.intercept_[0]]
-weights.to_csv(r"C:\Users\dell\OneDrive\Desktop\MINOR\LocalModels\Hospital2\Hospital2weights.csv", index=False)
-print("Numeric weights saved to Hospital2weights.csv")
+joblib.dump(model, OUT_PKL)
+print(f"\n💾 Model saved as {OUT_PKL.name}")
+features = list(feature_names) + ["intercept"]
+coefficients = list(model.coef_[0]) + [model.intercept_[0]]
+weights = pd.DataFrame({
+    "Feature": pd.Series(features, dtype="string"),
+    "Coefficient": pd.Series(coefficients, dtype="float64"),
+})
+weights.to_parquet(OUT_W, index=False)
+print(f"Numeric weights saved to {OUT_W.name}")